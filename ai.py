@@ -1,5 +1,15 @@
 import spacy
 import random
+import re
+import threading
+import time
+
+from spacy.attrs import DEP, LOWER
+
+from corpus import SMOKE_CORPUS
+from hotswap import ModelWatcher
+from language import LanguageIdentifier
+from profiling import rss_mb
 
 greetings = ["hi", "hello", "hey", "morning", "afternoon", "yo"]
 greetings_responses = [
@@ -57,64 +67,538 @@ goodbyes_responses = [
     "Have a nice day!",
 ]
 
+UNSURE_RESPONSE = "I'm sorry, I'm not sure how to answer that."
+too_long_responses = [
+    "That's too much text for me, could you say it in fewer words?",
+]
+truncated_responses = [
+    "That's a lot! I only read the first part.",
+]
+
+# Spanish pipeline: es_core_news_sm uses the universal dependency labels
+# instead of our own, so the intents are read from those. Spanish drops the
+# subject, the verb itself ("estás") is what tells us they ask about the bot.
+es_greetings = ["hola", "buenas", "buenos", "días", "tardes", "saludos"]
+es_greetings_responses = [
+    "¡Hola!",
+    "Hola humano amigable",
+    "¡Hola, qué tal!",
+    "¡Buenas!",
+]
+es_welcome_responses = [
+    "¡Hola! Soy un bot y puedes saludarme",
+    "¡Hola!, soy un bot de saludos",
+    "Bienvenido, salúdame cuando quieras",
+]
+es_questions = ["estás", "estas", "andas", "sientes"]
+es_targets_self = ["estás", "estas", "andas", "sientes", "tú", "bot"]
+es_self_state_responses = [
+    "Estoy bien, gracias",
+    "Gracias por preguntar, estoy muy bien",
+    "¡Ahora mismo me siento genial! Solo un poco dormido",
+]
+es_request = ["dime", "di", "cuéntame", "dame", "inspírame", "puedes"]
+es_request_quote = ["frase", "cita"]
+es_request_song = ["canta", "cántame", "cantar", "interpreta"]
+es_quotes = [
+    "Nunca desanimes a quien progresa continuamente, sin importar lo lento que sea",
+    "Ojalá viviera más el momento y dejara de esperar siempre cosas mejores",
+]
+es_songs = [
+    "La la la, una canción para ti, la la la",
+]
+es_goodbyes = ["adiós", "adios", "chao", "luego", "pronto", "mañana", "noches"]
+es_goodbyes_responses = [
+    "¡Hasta luego!",
+    "¡Adiós!",
+    "¡Nos vemos pronto!",
+    "¡Que tengas un buen día!",
+]
+es_unsure_response = "Lo siento, no sé cómo responder a eso."
+es_too_long_responses = [
+    "Es demasiado texto para mí, ¿puedes decirlo con menos palabras?",
+]
+es_truncated_responses = [
+    "¡Es mucho! Solo leí la primera parte.",
+]
+
+# Pipeline and intent lists for every language we can answer in
+INTENT_TABLES = {
+    "en": {
+        "model": "model",
+        "labels": {"obj": "OBJ", "state": "STATE", "target": "TARGET"},
+        "greetings": greetings,
+        "request": request,
+        "request_quote": request_quote,
+        "request_song": request_song,
+        "goodbyes": goodbyes,
+        "questions": questions,
+        "targets_self": targets_self,
+        "responses": {
+            "greeting": greetings_responses,
+            "quote": quotes,
+            "song": songs,
+            "goodbye": goodbyes_responses,
+            "self_state": self_state_responses,
+            "unsure": [UNSURE_RESPONSE],
+            "welcome": welcome_responses,
+            "too_long": too_long_responses,
+            "truncated": truncated_responses,
+        },
+    },
+    "es": {
+        "model": "es_core_news_sm",
+        "labels": {"obj": "obj", "state": "advmod", "target": "ROOT"},
+        "greetings": es_greetings,
+        "request": es_request,
+        "request_quote": es_request_quote,
+        "request_song": es_request_song,
+        "goodbyes": es_goodbyes,
+        "questions": es_questions,
+        "targets_self": es_targets_self,
+        "responses": {
+            "greeting": es_greetings_responses,
+            "quote": es_quotes,
+            "song": es_songs,
+            "goodbye": es_goodbyes_responses,
+            "self_state": es_self_state_responses,
+            "unsure": [es_unsure_response],
+            "welcome": es_welcome_responses,
+            "too_long": es_too_long_responses,
+            "truncated": es_truncated_responses,
+        },
+    },
+}
+
+# Seconds a non-default pipeline may go unused before it's unloaded
+IDLE_TIMEOUT = 600
+
+# Sentences the greedy parse can only answer with a welcome message get a
+# second, beam search parse. Beam parses less likely than this are ignored.
+BEAM_WIDTH = 8
+BEAM_MIN_PROB = 0.05
+
+# Input limits. Messages over MAX_CHARS are cut and anything over
+# REJECT_CHARS is turned down before the tokenizer ever sees it. "Words"
+# longer than MAX_WORD_CHARS (pasted URLs, keyboard mashing) are trimmed.
+MAX_CHARS = 500
+REJECT_CHARS = 4 * MAX_CHARS
+MAX_WORD_CHARS = 60
+MAX_TOKENS = 120
+MAX_SENTENCES = 8
+# Seconds a message may take. A chunk of sentences or a beam parse only
+# starts if the last one of its kind would still fit before the deadline.
+# The first parse and the first chunk always run, the budget has to cover
+# them (well under 0.1s for MAX_TOKENS tokens on the small models).
+TIME_BUDGET = 0.5
+CHUNK_SENTENCES = 2
+
+
+def guard(msg, max_chars=MAX_CHARS, reject_chars=REJECT_CHARS, max_word_chars=MAX_WORD_CHARS):
+    """Cheap checks on the raw text: returns (text to parse, was cut) or
+    (None, False) when the message shouldn't be parsed at all."""
+    if len(msg) > reject_chars:
+        return None, False
+    msg = re.sub(r"(\S{%d})\S+" % max_word_chars, r"\1", msg)
+    if len(msg) > max_chars:
+        # Cortar en el último espacio para no partir una palabra
+        cut = msg.rfind(" ", 0, max_chars + 1)
+        return msg[:cut if cut > 0 else max_chars], True
+    return msg, False
+
+# Columns of the feature rows returned by intent_features
+FEATURE_LABELS = ["root", "obj", "state", "target"]
+TRIGGER_LISTS = [
+    "greetings", "request", "request_quote", "request_song",
+    "goodbyes", "questions", "targets_self",
+]
+
+
+def empty_tier_stats():
+    return {"sentences": 0, "escalated": 0, "recovered": 0, "beam_s": 0.0}
+
+
+def hash_table(table, strings):
+    # Label and trigger words as string store ids, to compare against to_array
+    labels = dict(table["labels"], root="ROOT")
+    hashed = {
+        "labels": [labels[name] for name in FEATURE_LABELS],
+        "label_ids": [strings.add(labels[name]) for name in FEATURE_LABELS],
+    }
+    for name in TRIGGER_LISTS:
+        hashed[name] = {strings.add(word) for word in table[name]}
+    return hashed
+
+
+def intent_features(docs, label_ids):
+    """Lowercase id of the last token with each label, for every doc.
+
+    Returns one row per doc and one column per label id, 0 where the doc
+    has no token with that label. Each doc is read with one to_array call;
+    building a dict from its (dep, lower) pairs keeps the last token with
+    each label.
+    """
+    rows = []
+    for doc in docs:
+        last = dict(doc.to_array([DEP, LOWER]).tolist())
+        rows.append([last.get(label_id, 0) for label_id in label_ids])
+    return rows
+
 class AI():
     
-    def __init__(self):
-        self.nlp = spacy.load('model')
+    def __init__(self, default_lang="en", idle_timeout=IDLE_TIMEOUT, tiered=True,
+                 beam_width=BEAM_WIDTH, beam_min_prob=BEAM_MIN_PROB, max_chars=MAX_CHARS,
+                 reject_chars=REJECT_CHARS, max_word_chars=MAX_WORD_CHARS, max_tokens=MAX_TOKENS,
+                 max_sentences=MAX_SENTENCES, time_budget=TIME_BUDGET):
+        self.default_lang = default_lang
+        self.idle_timeout = idle_timeout
+        self.max_chars = max_chars
+        self.reject_chars = reject_chars
+        self.max_word_chars = max_word_chars
+        self.max_tokens = max_tokens
+        self.max_sentences = max_sentences
+        self.time_budget = time_budget
+        self.chunk_estimate = 0.0
+        self.beam_estimate = 0.0
+        self.tiered = tiered
+        self.beam_width = beam_width
+        self.beam_min_prob = beam_min_prob
+        self.tier_stats = empty_tier_stats()
+        # Short messages are routed by the trigger words of each table
+        self.identifier = LanguageIdentifier(default=default_lang, keywords={
+            lang: [word for name in TRIGGER_LISTS for word in table[name]]
+            for lang, table in INTENT_TABLES.items()
+        })
+        self.lock = threading.Lock()
+        # Loaded pipelines, they are only loaded when a message needs them
+        self.pipelines = {}
+        self.hashed = {}
+        self.last_used = {}
+        self.unavailable = set()
+        # Events for the pipelines being loaded right now
+        self.loading = {}
+        self.pipeline_stats = {
+            lang: {"loads": 0, "load_s": 0.0, "rss_mb": 0.0, "messages": 0, "message_s": 0.0}
+            for lang in INTENT_TABLES
+        }
+        self.watcher = None
+        _, self.nlp, _ = self.pipeline(default_lang)
+        self.eviction_timer = None
+        self.schedule_eviction()
+
+    def pipeline(self, lang, load=True):
+        # With load=False, returns None instead of loading a missing pipeline.
+        # Loading happens outside the lock so other languages keep answering;
+        # other callers asking for the same language wait for that load.
+        with self.lock:
+            if lang in self.unavailable:
+                lang = self.default_lang
+            if lang in self.pipelines:
+                self.last_used[lang] = time.monotonic()
+                return lang, self.pipelines[lang], self.hashed[lang]
+            if not load:
+                return None
+            loading = self.loading.get(lang)
+            if loading is None:
+                self.loading[lang] = threading.Event()
+        if loading is not None:
+            loading.wait()
+            return self.pipeline(lang, load)
+
+        try:
+            rss_before = rss_mb()
+            start = time.perf_counter()
+            try:
+                nlp = spacy.load(INTENT_TABLES[lang]["model"])
+            except OSError as e:
+                if lang == self.default_lang:
+                    raise
+                print(f"Can't load the '{lang}' pipeline, using '{self.default_lang}': {e}")
+                with self.lock:
+                    self.unavailable.add(lang)
+                return self.pipeline(self.default_lang, load)
+            hashed = hash_table(INTENT_TABLES[lang], nlp.vocab.strings)
+
+            with self.lock:
+                self.pipelines[lang] = nlp
+                self.hashed[lang] = hashed
+                self.last_used[lang] = time.monotonic()
+                stats = self.pipeline_stats[lang]
+                stats["loads"] += 1
+                stats["load_s"] += time.perf_counter() - start
+                stats["rss_mb"] = rss_mb() - rss_before
+            print(f"Loaded '{lang}' pipeline in {time.perf_counter() - start:.2f}s")
+            return lang, nlp, hashed
+        finally:
+            with self.lock:
+                self.loading.pop(lang).set()
+
+    def watch_model(self, lang=None, interval=5.0):
+        # Reload the pipeline whenever its model directory changes on disk
+        lang = lang or self.default_lang
+        self.watcher = ModelWatcher(INTENT_TABLES[lang]["model"], lambda: self.reload_pipeline(lang), interval)
+        self.watcher.start()
+        return self.watcher
+
+    def reload_pipeline(self, lang=None):
+        """Load the model again in the calling thread and swap it in.
+
+        The new pipeline is warmed up on the smoke corpus and only replaces
+        the current one if it gets at least as many intents right. Messages
+        already running keep their reference to the old pipeline, which is
+        freed once the last of them returns.
+        """
+        lang = lang or self.default_lang
+        start = time.perf_counter()
+        try:
+            nlp = spacy.load(INTENT_TABLES[lang]["model"])
+        except (OSError, ValueError) as e:
+            print(f"Can't reload the '{lang}' pipeline, keeping the current one: {e}")
+            return False
+        hashed = hash_table(INTENT_TABLES[lang], nlp.vocab.strings)
+
+        new_score = self.smoke_check(lang, nlp, hashed)
+        _, old_nlp, old_hashed = self.pipeline(lang)
+        old_score = self.smoke_check(lang, old_nlp, old_hashed)
+        if new_score < old_score:
+            print(f"New '{lang}' model failed the smoke check ({new_score:.0%} < {old_score:.0%}), keeping the current one")
+            return False
+
+        with self.lock:
+            self.pipelines[lang] = nlp
+            self.hashed[lang] = hashed
+            self.last_used[lang] = time.monotonic()
+            if lang == self.default_lang:
+                self.nlp = nlp
+            self.pipeline_stats[lang]["loads"] += 1
+            self.pipeline_stats[lang]["load_s"] += time.perf_counter() - start
+        print(f"Swapped in new '{lang}' model in {time.perf_counter() - start:.2f}s ({new_score:.0%} smoke check)")
+        return True
+
+    def smoke_check(self, lang, nlp, hashed):
+        # Share of the smoke corpus answered with the expected intent
+        corpus = SMOKE_CORPUS.get(lang, [])
+        if not corpus:
+            return 1.0
+        correct = sum(
+            self.intents(nlp, hashed, text) == [expected]
+            for text, expected in corpus
+        )
+        return correct / len(corpus)
+
+    def schedule_eviction(self):
+        # Look for idle pipelines on a timer, they may get no more messages
+        self.eviction_timer = threading.Timer(max(1.0, self.idle_timeout / 2), self._evict_and_reschedule)
+        self.eviction_timer.daemon = True
+        self.eviction_timer.start()
+
+    def _evict_and_reschedule(self):
+        try:
+            self.evict_idle()
+        finally:
+            self.schedule_eviction()
+
+    def evict_idle(self):
+        # The default pipeline stays loaded
+        now = time.monotonic()
+        with self.lock:
+            for lang in list(self.pipelines):
+                if lang != self.default_lang and now - self.last_used[lang] > self.idle_timeout:
+                    del self.pipelines[lang]
+                    del self.hashed[lang]
+                    del self.last_used[lang]
+                    print(f"Unloaded idle '{lang}' pipeline")
+
+    def language_report(self):
+        lines = ["lang  loads   load_s   rss_mb  messages  ms/message"]
+        for lang, stats in self.pipeline_stats.items():
+            per_message = stats["message_s"] / stats["messages"] * 1000 if stats["messages"] else 0.0
+            lines.append("%-4s %6d %8.2f %8.1f %9d %11.2f" % (
+                lang, stats["loads"], stats["load_s"], stats["rss_mb"], stats["messages"], per_message))
+        return "\n".join(lines)
+
 #Sending a message to AI
     def message(self, msg):
         if not msg:
             return None
-        doc = self.nlp(msg)
+        return self.respond(self.prepare(msg))
+
+    def prepare(self, msg, cancelled=None, load=True):
+        """Parse a message without picking the replies yet.
+
+        Returns (lang, intents, costs) for respond(), or None if
+        `cancelled()` became true while parsing, or if the message needs a
+        pipeline that isn't loaded and `load` is false. Nothing is added to the
+        stats until respond() is called, so parses that are never sent
+        don't count.
+        """
+        start = time.perf_counter()
+        deadline = start + self.time_budget if self.time_budget else None
+        tiers = empty_tier_stats()
+        text, cut = guard(msg, self.max_chars, self.reject_chars, self.max_word_chars)
+        if text is None:
+            print(f"Rejected a {len(msg)} character message")
+            return self.default_lang, ["too_long"], {"seconds": 0.0, "tiers": tiers}
+
+        loaded = self.pipeline(self.identifier.identify(text), load)
+        if loaded is None:
+            return None
+        lang, nlp, hashed = loaded
+
+        intents = self.intents(nlp, hashed, text, deadline, cancelled, tiers)
+        if intents is None:
+            return None
+        if cut and intents[-1:] != ["truncated"]:
+            intents.append("truncated")
+        return lang, intents, {"seconds": time.perf_counter() - start, "tiers": tiers}
+
+    def respond(self, prepared):
+        lang, intents, costs = prepared
+        self.record(lang, costs)
+        print(f"intents: {intents}")
+        table = INTENT_TABLES[lang]
+        responses = [random.choice(table["responses"][intent]) for intent in intents]
+
+        print("Response:")
+        print(responses)
+
+        return ' '.join(responses)
+
+    def record(self, lang, costs):
+        # Add the costs of a message that was answered to the stats
+        with self.lock:
+            stats = self.pipeline_stats[lang]
+            stats["messages"] += 1
+            stats["message_s"] += costs["seconds"]
+            for key, value in costs["tiers"].items():
+                self.tier_stats[key] += value
+
+    def intents(self, nlp, hashed, msg, deadline=None, cancelled=None, tiers=None):
+        """Intent of every sentence in `msg`, followed by "truncated" when
+        only part of the message fit in the limits or in the deadline.
+        None if `cancelled()` turns true between chunks. Escalation counts
+        are added to `tiers` when given."""
+        if tiers is None:
+            tiers = empty_tier_stats()
+        doc = nlp.make_doc(msg)
+        truncated = len(doc) > self.max_tokens
+        if truncated:
+            # Cut the text, not the Doc: a Span.as_doc() copy shares its
+            # tensor with the original and the tagger can't extend it
+            doc = nlp.make_doc(msg[:doc[self.max_tokens].idx])
+        for name, proc in nlp.pipeline:
+            doc = proc(doc)
+
         sentences = []
         sents = [s for s in doc.sents]
         for span in sents:
             span_list = list(span)
             sen = " ".join([e.text for e in span_list])
             sentences += [sen]
+        if len(sentences) > self.max_sentences:
+            sentences = sentences[:self.max_sentences]
+            truncated = True
 
-        docs = self.nlp.pipe(sentences)
-        responses = []
-
-        for doc in docs:
-                    
-            # Dependency label dictionary
-            label_dict = {t.dep_ : t for t in doc}
-            print(f"label_dict: {label_dict}")
-            
-
-            # Revisar si el ROOT es un saludo conocido
-            if label_dict["ROOT"].text.lower() in greetings:
-                # Responder con un saludo aleatorio
-                responses += [random.choice(greetings_responses)]
-
-            elif label_dict["ROOT"].text.lower() in request:
-                if "OBJ" in label_dict and label_dict["OBJ"].text.lower() in request_quote:
-                    responses += [random.choice(quotes)]
-                else:
-                    responses += ["I'm sorry, I'm not sure how to answer that."]
-
-            elif label_dict["ROOT"].text.lower() in request_song:
-                    responses += [random.choice(songs)]
-
-            elif label_dict["ROOT"].text.lower() in goodbyes:
-                responses += [random.choice(goodbyes_responses)]
-
-            elif label_dict["ROOT"].text.lower() in questions:
-                # Es una pregunta
-                # Responder si preguntan cómo estamos
-                if "STATE" in label_dict and "TARGET" in label_dict and label_dict["TARGET"].text.lower() in targets_self:
-                    responses += [random.choice(self_state_responses)]
-                else:
-                    responses += ["I'm sorry, I'm not sure how to answer that."]
-            
-            else:
-                # Responder con un mensaje de bienvenida aleatorio
-                responses += [random.choice(welcome_responses)]
+        # Slowest chunk and beam parse seen, carried over between messages
+        chunk_s = self.chunk_estimate
+        beam_s = self.beam_estimate
+        docs = []
+        for i in range(0, len(sentences), CHUNK_SENTENCES):
+            if cancelled is not None and cancelled():
+                return None
+            # The first chunk always runs so there's something to answer
+            if i and deadline is not None and time.perf_counter() + chunk_s > deadline:
+                truncated = True
+                break
+            chunk_start = time.perf_counter()
+            docs += nlp.pipe(sentences[i:i + CHUNK_SENTENCES])
+            chunk_s = max(chunk_s, time.perf_counter() - chunk_start)
 
-        print("Response:")
-        print(responses)
+        # Features of every parsed sentence at once, then the second opinions
+        intents = [self.intent(hashed, row) for row in intent_features(docs, hashed["label_ids"])]
+        tiers["sentences"] += len(intents)
+        if self.tiered:
+            for j, intent in enumerate(intents):
+                if cancelled is not None and cancelled():
+                    return None
+                # No second opinions that wouldn't finish in time
+                if intent == "welcome" and (deadline is None or time.perf_counter() + beam_s < deadline):
+                    beam_start = time.perf_counter()
+                    intents[j] = self.second_opinion(nlp, hashed, docs[j], tiers)
+                    beam_s = max(beam_s, time.perf_counter() - beam_start)
 
-        return ' '.join(responses)
+        self.chunk_estimate = max(self.chunk_estimate, chunk_s)
+        self.beam_estimate = max(self.beam_estimate, beam_s)
+        if truncated:
+            intents.append("truncated")
+        return intents
+
+    def second_opinion(self, nlp, hashed, doc, tiers):
+        # Beam parse a sentence the greedy parse fell back on and take the
+        # most likely parse that matches an intent
+        start = time.perf_counter()
+        tiers["escalated"] += 1
+        parser = nlp.get_pipe("parser")
+        beam = parser.beam_parse([nlp.make_doc(doc.text)], beam_width=self.beam_width)[0]
+        intent = "welcome"
+        for prob, parse in sorted(parser.moves.get_beam_parses(beam), key=lambda p: p[0], reverse=True):
+            if prob < self.beam_min_prob:
+                break
+            # Same columns as intent_features: last token with each label
+            last = {label: i for head, i, label in parse}
+            row = [doc[last[label]].lower if label in last else 0 for label in hashed["labels"]]
+            intent = self.intent(hashed, row)
+            if intent != "welcome":
+                tiers["recovered"] += 1
+                break
+        tiers["beam_s"] += time.perf_counter() - start
+        return intent
+
+    def tier_report(self):
+        with self.lock:
+            stats = dict(self.tier_stats)
+        sentences = stats["sentences"] or 1
+        escalated = stats["escalated"] or 1
+        return (
+            f"escalated {stats['escalated']} of {stats['sentences']} sentences "
+            f"({stats['escalated'] / sentences:.1%}), recovered {stats['recovered']}, "
+            f"{stats['beam_s'] / escalated * 1000:.2f}ms per beam parse"
+        )
+
+    def intent(self, hashed, row):
+        # row: ids of the lowercase ROOT, OBJ, STATE and TARGET tokens
+        root, obj, state, target = row
+
+        # Revisar si el ROOT es un saludo conocido
+        if root in hashed["greetings"]:
+            return "greeting"
+
+        elif root in hashed["request"]:
+            if obj and obj in hashed["request_quote"]:
+                return "quote"
+            return "unsure"
+
+        elif root in hashed["request_song"]:
+            return "song"
+
+        elif root in hashed["goodbyes"]:
+            return "goodbye"
+
+        elif root in hashed["questions"]:
+            # Es una pregunta
+            # Responder si preguntan cómo estamos
+            if state and target and target in hashed["targets_self"]:
+                return "self_state"
+            return "unsure"
 
+        # Responder con un mensaje de bienvenida aleatorio
+        return "welcome"
 
+    def canned_responses(self):
+        # Every fixed reply the bot can give, in any language
+        return [
+            response
+            for table in INTENT_TABLES.values()
+            for pool in table["responses"].values()
+            for response in pool
+        ]
@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""Benchmarks for the chatbot AI
+
+    ./bench.py intents -n 200
+    ./bench.py tiers -n 20
+    ./bench.py guardrails -n 5
+    ./bench.py languages
+"""
+from __future__ import print_function, division
+
+import os
+import sys
+import time
+from contextlib import redirect_stdout
+
+import plac
+
+import ai
+from corpus import TEST_SENTENCES, INTENT_CORPUS, SMOKE_CORPUS, SPANISH_SENTENCES
+
+
+def label_dict_intent(table, doc):
+    # Intent from a {dep: token} dict, the way AI.message used to do it
+    label_dict = {t.dep_: t for t in doc}
+    labels = table["labels"]
+    root = label_dict["ROOT"].text.lower()
+    if root in table["greetings"]:
+        return "greeting"
+    elif root in table["request"]:
+        if labels["obj"] in label_dict and label_dict[labels["obj"]].text.lower() in table["request_quote"]:
+            return "quote"
+        return "unsure"
+    elif root in table["request_song"]:
+        return "song"
+    elif root in table["goodbyes"]:
+        return "goodbye"
+    elif root in table["questions"]:
+        if (labels["state"] in label_dict and labels["target"] in label_dict
+                and label_dict[labels["target"]].text.lower() in table["targets_self"]):
+            return "self_state"
+        return "unsure"
+    return "welcome"
+
+
+def bench_intents(bot, n_iter):
+    """Per-doc cost of the label dict and the to_array intent extraction."""
+    lang, nlp, hashed = bot.pipeline("en")
+    table = ai.INTENT_TABLES[lang]
+    docs = list(nlp.pipe(TEST_SENTENCES))
+
+    dict_intents = [label_dict_intent(table, doc) for doc in docs]
+    array_intents = [bot.intent(hashed, row)
+                     for row in ai.intent_features(docs, hashed["label_ids"])]
+    for text, old, new in zip(TEST_SENTENCES, dict_intents, array_intents):
+        if old != new:
+            print("MISMATCH %r: label dict %s, arrays %s" % (text, old, new))
+    assert dict_intents == array_intents
+
+    start = time.perf_counter()
+    for _ in range(n_iter):
+        [label_dict_intent(table, doc) for doc in docs]
+    dict_time = time.perf_counter() - start
+
+    # In batches of one message's sentences, the way AI.intents calls it
+    batches = [docs[i:i + bot.max_sentences] for i in range(0, len(docs), bot.max_sentences)]
+    start = time.perf_counter()
+    for _ in range(n_iter):
+        for batch in batches:
+            [bot.intent(hashed, row) for row in ai.intent_features(batch, hashed["label_ids"])]
+    array_time = time.perf_counter() - start
+
+    n_docs = n_iter * len(docs)
+    print("%d docs, identical intents" % len(docs))
+    print("label dict: %8.2fus per doc" % (dict_time / n_docs * 1e6))
+    print("to_array:   %8.2fus per doc" % (array_time / n_docs * 1e6))
+
+
+def bench_tiers(bot, n_iter):
+    """Greedy parse only against greedy plus beam parse on fallbacks."""
+    lang, nlp, hashed = bot.pipeline("en")
+    results = {}
+    for tiered in (False, True):
+        bot.tiered = tiered
+        tiers = ai.empty_tier_stats()
+        start = time.perf_counter()
+        for _ in range(n_iter):
+            predicted = [bot.intents(nlp, hashed, text, tiers=tiers) for text, _ in INTENT_CORPUS]
+        seconds = (time.perf_counter() - start) / (n_iter * len(INTENT_CORPUS))
+        correct = sum(p == [expected] for p, (_, expected) in zip(predicted, INTENT_CORPUS))
+        fallbacks = sum(p == ["welcome"] for p in predicted)
+        results[tiered] = (seconds, correct, fallbacks, tiers)
+
+    n = len(INTENT_CORPUS)
+    for tiered, (seconds, correct, fallbacks, stats) in results.items():
+        print("%-7s %7.2fms per message, %2d/%d correct, %2d fallbacks" % (
+            "tiered" if tiered else "greedy", seconds * 1000, correct, n, fallbacks))
+    stats = results[True][3]
+    print("escalation rate: %.1f%%" % (stats["escalated"] / stats["sentences"] * 100))
+    print("added latency:   %.2fms per message" % ((results[True][0] - results[False][0]) * 1000))
+    print("accuracy gained: %+d sentences" % (results[True][1] - results[False][1]))
+
+
+ADVERSARIAL_INPUTS = {
+    "huge paste": "hello bot, how are you doing today? " * 30000,
+    "just over the reject limit": "hi " * (ai.REJECT_CHARS // 3 + 1),
+    "one endless word": "a" * (ai.REJECT_CHARS - 1),
+    "long words": ("x" * ai.MAX_WORD_CHARS + " ") * (ai.REJECT_CHARS // (ai.MAX_WORD_CHARS + 1)),
+    "many sentences": "hi. " * (ai.REJECT_CHARS // 4),
+    "many tokens": "hi " * (ai.REJECT_CHARS // 3),
+    "punctuation": ". , ! ? " * (ai.REJECT_CHARS // 8),
+    "long unknown sentences": ("how did the cat get there with a hat and a bat " * 10 + ". ") * 4,
+    "emoji": "\U0001F600 " * (ai.REJECT_CHARS // 2),
+}
+
+
+def bench_guardrails(bot, n_iter):
+    """Worst case latency of AI.message on adversarial inputs."""
+    worst = 0.0
+    for name, text in ADVERSARIAL_INPUTS.items():
+        times = []
+        for _ in range(n_iter):
+            start = time.perf_counter()
+            with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+                bot.message(text)
+            times.append(time.perf_counter() - start)
+        worst = max(worst, max(times))
+        print("%-28s %8d chars %8.1fms max" % (name, len(text), max(times) * 1000))
+    print("worst case %.1fms, budget %.1fms" % (worst * 1000, bot.time_budget * 1000))
+    if worst > bot.time_budget:
+        print("FAIL: worst case is over the budget")
+        sys.exit(1)
+
+
+def bench_languages(bot, n_iter):
+    """Every corpus phrase must be routed to its own language."""
+    expected = [(text, "en") for text in TEST_SENTENCES]
+    expected += [(text, "en") for text, _ in INTENT_CORPUS + SMOKE_CORPUS["en"]]
+    expected += [(text, "es") for text in SPANISH_SENTENCES]
+    wrong = [(text, lang) for text, lang in expected if bot.identifier.identify(text) != lang]
+    for text, lang in wrong:
+        print("WRONG %r should go to %s" % (text, lang))
+
+    start = time.perf_counter()
+    for _ in range(n_iter):
+        for text, _ in expected:
+            bot.identifier.identify(text)
+    seconds = (time.perf_counter() - start) / (n_iter * len(expected))
+    print("%d of %d phrases routed right, %.1fus per message" % (
+        len(expected) - len(wrong), len(expected), seconds * 1e6))
+    if wrong:
+        sys.exit(1)
+
+
+BENCHMARKS = {
+    "intents": bench_intents,
+    "tiers": bench_tiers,
+    "guardrails": bench_guardrails,
+    "languages": bench_languages,
+}
+
+
+@plac.annotations(
+    benchmark=("Benchmark to run", "positional", None, str, list(BENCHMARKS)),
+    n_iter=("Number of repetitions", "option", "n", int),
+)
+def main(benchmark, n_iter=200):
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        bot = ai.AI()
+    BENCHMARKS[benchmark](bot, n_iter)
+
+
+if __name__ == "__main__":
+    plac.call(main)
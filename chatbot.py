@@ -1,3 +1,5 @@
+import os
+
 import kivy
 kivy.require('2.0.0')
 
@@ -6,11 +8,13 @@ from kivy.uix.label import Label
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.scrollview import ScrollView
 from kivy.core.window import Window
+from kivy.clock import Clock
 
 from messages import Messages
 from inputs import Inputs
 
 from ai import AI
+import frameprof
 
 from kivy.config import Config
 Config.set('graphics', 'width', '400')
@@ -28,10 +32,19 @@ class MainScreen(BoxLayout):
         self.messages.bind(minimum_height=self.messages.setter('height'))
 
         self.ai = AI()
+        # Cargar el modelo nuevo cuando train.py lo reescriba
+        self.ai.watch_model()
 
         self.inputs.set_messages_handler(self.messages)
         self.inputs.set_ai(self.ai)
 
+        # Rasterizar las respuestas fijas cuando la app ya arrancó
+        # CHATBOT_TEXTURE_CACHE=0 turns it off to compare render times
+        self.messages.use_texture_cache = os.environ.get('CHATBOT_TEXTURE_CACHE', '1') != '0'
+        if self.messages.use_texture_cache:
+            Clock.schedule_once(
+                lambda dt: self.messages.warm_texture_cache(self.ai.canned_responses()), 1)
+
 class ChatbotApp(App):
     def build(self):
         self.title = 'Chatbotely'
@@ -61,6 +74,23 @@ class ChatbotApp(App):
         # self.layout.add_widget(self.inputs)
         # return self.layout
 
+    def on_start(self):
+        # CHATBOT_FRAMEPROF=trace.json mide cada frame y guarda la traza al salir
+        # Starts after build() so loading the model isn't timed as a frame
+        if os.environ.get('CHATBOT_FRAMEPROF'):
+            frameprof.enable()
+
+    def on_stop(self):
+        print(self.root.messages.render_report())
+        print(self.root.inputs.speculation_report())
+        print(self.root.ai.language_report())
+        print(self.root.ai.tier_report())
+        if frameprof.profiler is not None:
+            frameprof.profiler.stop()
+            print(frameprof.profiler.report())
+            frameprof.profiler.write_trace(os.environ['CHATBOT_FRAMEPROF'])
+            print('Saved frame trace to', os.environ['CHATBOT_FRAMEPROF'])
+
 
 if __name__ == "__main__":
 
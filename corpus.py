@@ -0,0 +1,91 @@
+# Sentences the parser gets tested with (same ones as train.test_model)
+TEST_SENTENCES = [
+    "hello bot",
+    "hello there",
+    "hi good morning",
+    "hey bot",
+    "Hello",
+    "HI THERE",
+
+    "how are you doing bot",
+    "how do you do",
+    "how do you feel",
+
+    "how is the weather",
+    "how did the cat get there",
+    "how can I find the restroom",
+
+    "hi my name is Steve",
+
+    "hi how are you. sing something",
+    "sing me a song all aloud",
+    "sing a lullaby",
+
+    "tell a famous quote",
+    "say famous phrase",
+    "inspire me with a quote",
+
+    "goodbye friend",
+    "bye bye",
+    "have a good night",
+    "see you soon",
+]
+
+# Sentences a usable model must get right, with the intent expected for each
+SMOKE_CORPUS = {
+    "en": [
+        ("hello bot", "greeting"),
+        ("hi there", "greeting"),
+        ("hey you", "greeting"),
+        ("how are you doing", "self_state"),
+        ("how are you feeling", "self_state"),
+        ("tell me a quote", "quote"),
+        ("tell me a phrase", "quote"),
+        ("sing something", "song"),
+        ("chant to me", "song"),
+        ("goodbye", "goodbye"),
+        ("bye", "goodbye"),
+        ("see you soon", "goodbye"),
+    ],
+}
+
+# Single sentence test phrases with the intent a person would expect
+INTENT_CORPUS = [
+    ("hello bot", "greeting"),
+    ("hello there", "greeting"),
+    ("hi good morning", "greeting"),
+    ("hey bot", "greeting"),
+    ("Hello", "greeting"),
+    ("HI THERE", "greeting"),
+    ("hi my name is Steve", "greeting"),
+    ("how are you doing bot", "self_state"),
+    ("how do you do", "self_state"),
+    ("how do you feel", "self_state"),
+    ("how is the weather", "unsure"),
+    ("how did the cat get there", "unsure"),
+    ("how can I find the restroom", "unsure"),
+    ("sing me a song all aloud", "song"),
+    ("sing a lullaby", "song"),
+    ("tell a famous quote", "quote"),
+    ("say famous phrase", "quote"),
+    ("inspire me with a quote", "quote"),
+    ("goodbye friend", "goodbye"),
+    ("bye bye", "goodbye"),
+    ("have a good night", "goodbye"),
+    ("see you soon", "goodbye"),
+]
+
+# Spanish messages the language identifier should send to the "es" pipeline
+SPANISH_SENTENCES = [
+    "hola",
+    "¡Hola!",
+    "adiós",
+    "chao",
+    "buenas",
+    "¿cómo estás?",
+    "buenos días",
+    "dime una frase famosa",
+    "cántame una canción",
+    "hasta luego",
+    "adiós amigo",
+]
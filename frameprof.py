@@ -0,0 +1,127 @@
+"""Frame timing for ChatbotApp
+
+A callback scheduled on the Kivy Clock every frame measures how long each
+frame took. Code that can stall the UI runs inside section() (or a
+function decorated with tagged()), so a slow frame can be traced back to
+the on_send, add_message or layout that ran during it. Everything is a
+no-op until enable() is called.
+"""
+from __future__ import division
+
+import functools
+import time
+from contextlib import contextmanager, nullcontext
+
+import srsly
+from kivy.clock import Clock
+
+from profiling import percentile
+
+# Two frames at Kivy's default 60 fps, anything slower is a visible stall
+FRAME_BUDGET = 2 / 60
+
+profiler = None
+
+
+class FrameProfiler():
+
+    def __init__(self, budget=FRAME_BUDGET):
+        self.budget = budget
+        # (start, seconds, tags) per frame and (name, start, seconds) per section
+        self.frames = []
+        self.sections = []
+        self._tags = set()
+        self._last = None
+        self._event = None
+
+    def start(self):
+        self._last = None
+        self._event = Clock.schedule_interval(self._tick, 0)
+
+    def stop(self):
+        if self._event is not None:
+            self._event.cancel()
+            self._event = None
+
+    def _tick(self, dt):
+        now = time.perf_counter()
+        if self._last is None:
+            # The first tick only marks where frame timing starts, whatever
+            # ran before it (loading, window creation) isn't a frame
+            self._tags = set()
+            self._last = now
+            return
+        self.frames.append((self._last, now - self._last, sorted(self._tags)))
+        self._tags = set()
+        self._last = now
+
+    @contextmanager
+    def section(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._tags.add(name)
+            self.sections.append((name, start, time.perf_counter() - start))
+
+    def janky_frames(self):
+        return [frame for frame in self.frames if frame[1] > self.budget]
+
+    def report(self, n_worst=5):
+        durations = [seconds for _, seconds, _ in self.frames]
+        janky = self.janky_frames()
+        lines = [
+            f"{len(durations)} frames, {len(janky)} over the {self.budget * 1000:.1f}ms budget",
+            "frame time p50 %.1fms p95 %.1fms p99 %.1fms max %.1fms" % (
+                percentile(durations, 50) * 1000, percentile(durations, 95) * 1000,
+                percentile(durations, 99) * 1000, max(durations, default=0.0) * 1000),
+        ]
+        by_tag = {}
+        for _, seconds, tags in janky:
+            for tag in tags or ["(untagged)"]:
+                by_tag[tag] = by_tag.get(tag, 0) + 1
+        for tag, count in sorted(by_tag.items(), key=lambda item: item[1], reverse=True):
+            lines.append(f"  {count:5d} slow frames with {tag}")
+        for start, seconds, tags in sorted(janky, key=lambda frame: frame[1], reverse=True)[:n_worst]:
+            lines.append(f"  {seconds * 1000:7.1f}ms at {start - self.frames[0][0]:.2f}s {', '.join(tags)}")
+        return "\n".join(lines)
+
+    def write_trace(self, path):
+        # Chrome trace event format, opens in chrome://tracing or Perfetto
+        origin = self.frames[0][0] if self.frames else 0.0
+        events = [
+            {"name": "frame", "cat": "jank" if seconds > self.budget else "frame", "ph": "X",
+             "ts": (start - origin) * 1e6, "dur": seconds * 1e6, "pid": 0, "tid": 0,
+             "args": {"tags": tags}}
+            for start, seconds, tags in self.frames
+        ]
+        events += [
+            {"name": name, "cat": "section", "ph": "X",
+             "ts": (start - origin) * 1e6, "dur": seconds * 1e6, "pid": 0, "tid": 1}
+            for name, start, seconds in self.sections
+        ]
+        srsly.write_json(path, {"traceEvents": events, "displayTimeUnit": "ms"})
+
+
+def enable(budget=FRAME_BUDGET):
+    global profiler
+    profiler = FrameProfiler(budget)
+    profiler.start()
+    return profiler
+
+
+def section(name):
+    if profiler is None:
+        return nullcontext()
+    return profiler.section(name)
+
+
+def tagged(name):
+    # Decorator version of section()
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with section(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
@@ -0,0 +1,58 @@
+"""Watch a model directory and report when a new version is written
+
+train.py overwrites the files of the output directory one by one, so a
+change only counts once the directory has stopped changing for a whole
+polling interval.
+"""
+import threading
+import traceback
+from pathlib import Path
+
+
+def directory_signature(path):
+    # Modification time and size of every file in the directory
+    path = Path(path)
+    if not path.exists():
+        return None
+    return tuple(sorted(
+        (str(f.relative_to(path)), f.stat().st_mtime_ns, f.stat().st_size)
+        for f in path.rglob("*") if f.is_file()
+    ))
+
+
+class ModelWatcher(threading.Thread):
+    """Calls `on_change` from this thread after `path` changes and settles."""
+
+    def __init__(self, path, on_change, interval=5.0):
+        super(ModelWatcher, self).__init__(daemon=True)
+        self.path = path
+        self.on_change = on_change
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def stop(self):
+        self.stopped.set()
+
+    def run(self):
+        current = directory_signature(self.path)
+        pending = None
+        while not self.stopped.wait(self.interval):
+            try:
+                signature = directory_signature(self.path)
+            except OSError:
+                # Files removed while listing them, still being written
+                pending = None
+                continue
+            if signature == current or signature is None:
+                pending = None
+            elif signature != pending:
+                pending = signature
+            else:
+                current = signature
+                pending = None
+                # A broken model must not stop the watcher for good
+                try:
+                    self.on_change()
+                except Exception:
+                    print(f"Reloading '{self.path}' failed, still watching it")
+                    traceback.print_exc()
@@ -1,3 +1,6 @@
+import threading
+import time
+
 import kivy
 kivy.require('2.0.0')
 
@@ -8,6 +11,13 @@ from kivy.properties import ObjectProperty
 from kivy.clock import Clock
 from kivy.core.window import Window
 
+import frameprof
+
+# Longer messages are shortened on screen, they don't fit in a 40dp row
+MAX_DISPLAY_CHARS = 200
+# Seconds the text has to stay the same before it's parsed ahead of time
+SPECULATION_DELAY = 0.3
+
 class Inputs(BoxLayout):
     text_input=ObjectProperty(None)
     button=ObjectProperty(None)
@@ -22,12 +32,53 @@ class Inputs(BoxLayout):
         # self.button.bind(on_press=self.on_send)
         Clock.schedule_once(self.setup_bindings, 1)
 
+        # Parseo especulativo mientras el usuario escribe
+        self.speculation = None
+        self.speculation_thread = None
+        self.generation = 0
+        self.speculation_stats = {'sends': 0, 'hits': 0, 'saved_s': 0.0}
+        self._speculate_trigger = Clock.create_trigger(self.speculate, SPECULATION_DELAY)
+
         # self.add_widget(self.textInput)
         # self.add_widget(self.button)
     
     def setup_bindings(self, dt):
         self.button.bind(on_press=self.on_send)
         Window.bind(on_key_down=self.on_key_down)
+        self.text_input.bind(text=self.on_text)
+
+    def on_text(self, instance, text):
+        # Any edit makes the running speculation stale
+        self.generation += 1
+        self.speculation = None
+        self._speculate_trigger.cancel()
+        if text:
+            self._speculate_trigger()
+
+    def speculate(self, dt):
+        # Only one speculation at a time. A running one is stale by now and
+        # stops at its next chunk, try again once it's done
+        if self.speculation_thread is not None and self.speculation_thread.is_alive():
+            self._speculate_trigger()
+            return
+        self.speculation_thread = threading.Thread(
+            target=self._speculate, args=(self.text_input.text, self.generation), daemon=True)
+        self.speculation_thread.start()
+
+    def _speculate(self, text, generation):
+        start = time.perf_counter()
+        # Never load a model for text that may still change
+        prepared = self.ai.prepare(
+            text, cancelled=lambda: self.generation != generation, load=False)
+        if prepared is not None and self.generation == generation:
+            self.speculation = (text, prepared, time.perf_counter() - start)
+
+    def speculation_report(self):
+        stats = self.speculation_stats
+        sends = stats['sends'] or 1
+        hits = stats['hits'] or 1
+        return (f"speculation: {stats['hits']} of {stats['sends']} sends ({stats['hits'] / sends:.0%}), "
+                f"{stats['saved_s'] * 1000:.0f}ms saved, {stats['saved_s'] / hits * 1000:.1f}ms per hit")
 
     def on_key_down (self, instance, keyboard, keycode, text, modifiers):
         if self.text_input.focus and keycode == 40:
@@ -39,6 +90,7 @@ class Inputs(BoxLayout):
     def set_ai(self, ai):
         self.ai = ai
     
+    @frameprof.tagged('on_send')
     def on_send(self, instance):
         print('Send!')
         # 1. Leer mensaje desde el input
@@ -49,14 +101,26 @@ class Inputs(BoxLayout):
             return
 
         # 2.5. Agregar mensaje a pantalla
-        self.messages_handler.add_message(message)
+        if len(message) > MAX_DISPLAY_CHARS:
+            self.messages_handler.add_message(message[:MAX_DISPLAY_CHARS] + '...')
+        else:
+            self.messages_handler.add_message(message)
+
+        # Parseo hecho mientras escribía, si el texto no cambió
+        speculation = self.speculation
 
         # 3. Limpiar el input
         self.text_input.text = ''
 
         # 4. Pasarle el mensaje a la AI
-        response = self.ai.message(message)
+        self.speculation_stats['sends'] += 1
+        if speculation is not None and speculation[0] == message:
+            self.speculation_stats['hits'] += 1
+            self.speculation_stats['saved_s'] += speculation[2]
+            response = self.ai.respond(speculation[1])
+        else:
+            response = self.ai.message(message)
 
         if response:
             # 5. Agregar respuesta de AI a la pantalla
-            self.messages_handler.add_message(response)
+            self.messages_handler.add_message(response, reply=True)
@@ -0,0 +1,122 @@
+"""Cheap character n-gram language identification
+
+Each language gets a profile of character trigram frequencies built from a
+few lines of chat-like seed text. A message is scored against every profile
+with add-one smoothed log probabilities, which costs a dict lookup per
+character and needs no model to be loaded.
+"""
+from __future__ import division
+
+import math
+import re
+from collections import Counter
+
+
+SEED_TEXT = {
+    "en": """
+        hi there hello bot hey you good morning good afternoon good evening
+        how are you doing how do you feel what are you doing today
+        tell me a quote say something to me tell me something inspiring
+        tell me a famous quote say a famous phrase inspire me with a quote
+        can you sing something for me sing me a song with your voice
+        sing a lullaby perform a song chant to me intone a melody
+        goodbye see you later see you soon have a good night bye friend
+        farewell my friend so long see you tomorrow see you next time
+        what is the weather like where is the restroom my name is
+        how did the cat get there how can I find the station
+        thank you very much that is nice I think you are the best
+        would you like to talk with me about the things that happened
+        yes no maybe please sorry okay sure of course not really
+        the quick brown fox jumps over the lazy dog while the sun shines
+        this phrase is famous because everyone knows it and says it often
+        they should show us what they have and where they went with them
+        I was thinking that we could go there together after the show
+        which one do you want and why would anybody say something like that
+    """,
+    "es": """
+        hola buenos días buenas tardes buenas noches qué tal cómo estás
+        cómo te va qué haces hoy cómo te sientes dime una frase famosa
+        dime algo que me inspire cuéntame algo puedes cantar algo para mí
+        cántame una canción adiós hasta luego nos vemos pronto hasta mañana
+        qué tiempo hace dónde está el baño mi nombre es muchas gracias
+        eso es muy bonito creo que eres el mejor quieres hablar conmigo
+        de las cosas que pasaron señor niño año pequeño también aquí
+        sí no quizás por favor perdón vale claro que sí por supuesto
+        el perro rápido salta sobre el gato perezoso mientras llueve
+        esta frase es famosa porque todos la conocen y la dicen mucho
+        ellos deberían mostrarnos lo que tienen y adónde fueron con ellas
+        estaba pensando que podríamos ir juntos después de la película
+        cuál quieres y por qué alguien diría algo así en la calle
+        me gustaría que me cantaras una canción de cuna esta noche
+    """,
+}
+
+
+def trigrams(text):
+    text = " %s " % " ".join(text.lower().split())
+    return [text[i:i + 3] for i in range(len(text) - 2)]
+
+
+class LanguageIdentifier():
+    """Picks the most likely language of a message from its trigrams.
+
+    Scores are averaged per trigram so long and short messages are judged
+    alike. Messages with fewer than `min_trigrams` trigrams are too short
+    to score; they go to the language whose `keywords` contain the most of
+    their words. Ties, messages without known words and messages whose best
+    two languages are within `min_margin` nats per trigram go to the
+    `default` language.
+    """
+
+    def __init__(self, seed_text=SEED_TEXT, default="en", min_margin=0.25, min_trigrams=8,
+                 keywords=None):
+        self.default = default
+        self.min_margin = min_margin
+        self.min_trigrams = min_trigrams
+        self.keywords = {lang: {word.lower() for word in words}
+                         for lang, words in (keywords or {}).items()}
+        self.profiles = {}
+        for lang, text in seed_text.items():
+            counts = Counter(trigrams(text))
+            total = sum(counts.values())
+            vocab = len(counts) + 1
+            self.profiles[lang] = (
+                {gram: math.log((n + 1) / (total + vocab)) for gram, n in counts.items()},
+                math.log(1 / (total + vocab)),
+            )
+
+    @property
+    def languages(self):
+        return list(self.profiles)
+
+    def scores(self, text):
+        # Mean log probability per trigram
+        grams = trigrams(text)
+        if not grams:
+            return {lang: 0.0 for lang in self.profiles}
+        return {
+            lang: sum(logprobs.get(gram, unseen) for gram in grams) / len(grams)
+            for lang, (logprobs, unseen) in self.profiles.items()
+        }
+
+    def lookup(self, text):
+        # Language with the most exact keyword matches, None on a tie
+        words = re.findall(r"\w+", text.lower())
+        hits = sorted(
+            ((sum(word in keywords for word in words), lang) for lang, keywords in self.keywords.items()),
+            reverse=True,
+        )
+        if not hits or not hits[0][0] or (len(hits) > 1 and hits[0][0] == hits[1][0]):
+            return None
+        return hits[0][1]
+
+    def identify(self, text):
+        if len(trigrams(text)) < self.min_trigrams:
+            return self.lookup(text) or self.default
+        scores = sorted(self.scores(text).items(), key=lambda item: item[1], reverse=True)
+        if len(scores) < 2:
+            return scores[0][0] if scores else self.default
+        (best, best_score), (_, second_score) = scores[:2]
+        if best_score - second_score < self.min_margin:
+            return self.default
+        return best
@@ -1,12 +1,40 @@
 import kivy
 kivy.require('2.0.0')
 
+import time
+
 from kivy.app import App
 from kivy.uix.label import Label
+from kivy.uix.widget import Widget
 from kivy.graphics import Color, Rectangle
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.stacklayout import StackLayout
 from kivy.uix.gridlayout import GridLayout
+from kivy.core.text import Label as CoreLabel
+from kivy.clock import Clock
+from kivy.metrics import sp
+
+import frameprof
+
+MESSAGE_FONT = 'Roboto-Bold.ttf'
+# Same size a Label uses by default
+MESSAGE_FONT_SIZE = 15
+
+
+class CachedMessage(Widget):
+    # Draws an already rendered text texture at its own size, centered the
+    # same way a Label draws its text
+    def __init__(self, texture, **kwargs):
+        super(CachedMessage, self).__init__(**kwargs)
+        self.texture = texture
+        with self.canvas:
+            Color(1, 1, 1, 1)
+            self.rect = Rectangle(texture=texture, size=texture.size)
+        self.bind(pos=self.update_rect, size=self.update_rect)
+
+    def update_rect(self, *largs):
+        self.rect.pos = (int(self.center_x - self.texture.width / 2.),
+                         int(self.center_y - self.texture.height / 2.))
 
 
 class Messages(GridLayout):
@@ -21,9 +49,75 @@ class Messages(GridLayout):
         # self.add_widget(self.message2)
         # self.add_widget(self.message3)
 
-    def add_message(self, message):
-        # Crear Label cuyo texto será el mensaje
-        label = Label(text=message, size_hint=(1, .10), font_name='Roboto-Bold.ttf')
+        # Texturas ya rasterizadas de las respuestas fijas del bot
+        self.use_texture_cache = True
+        self.texture_cache = {}
+        self.cacheable = set()
+        # Bot replies from the cache or rendered again, and user messages
+        self.render_times = {'cached': [], 'uncached': [], 'user': []}
+        self._warm_queue = []
+
+    def warm_texture_cache(self, texts, per_frame=2):
+        # Textures can only be made on the main thread, so the warm up is
+        # spread over the next frames instead of a background thread
+        if not self.use_texture_cache:
+            return
+        self.cacheable.update(texts)
+        self._warm_queue = [t for t in self.cacheable if t not in self.texture_cache]
+        Clock.schedule_interval(lambda dt: self._warm_step(per_frame), 0)
+
+    @frameprof.tagged('warm_textures')
+    def _warm_step(self, per_frame):
+        for _ in range(per_frame):
+            if not self._warm_queue:
+                print(f'Texture cache warm: {len(self.texture_cache)} textures')
+                return False
+            text = self._warm_queue.pop()
+            if text not in self.texture_cache:
+                self.texture_cache[text] = self.render_texture(text)
+
+    def render_texture(self, text):
+        label = CoreLabel(text=text, font_name=MESSAGE_FONT, font_size=sp(MESSAGE_FONT_SIZE))
+        label.refresh()
+        return label.texture
+
+    @frameprof.tagged('layout')
+    def do_layout(self, *largs):
+        super(Messages, self).do_layout(*largs)
+
+    @frameprof.tagged('add_message')
+    def add_message(self, message, reply=False):
+        start = time.perf_counter()
+        texture = self.texture_cache.get(message) if reply and self.use_texture_cache else None
+
+        if texture is not None:
+            # Respuesta conocida: reusar su textura sin volver a rasterizar
+            widget = CachedMessage(texture, size_hint=(1, .10))
+            kind = 'cached'
+        else:
+            # Crear Label cuyo texto será el mensaje
+            widget = Label(text=message, size_hint=(1, .10), font_name=MESSAGE_FONT)
+            # Render now instead of on the next frame so it's counted here
+            widget.texture_update()
+            widget._trigger_texture.cancel()
+            if reply and self.use_texture_cache and message in self.cacheable:
+                self.texture_cache[message] = widget.texture
+            kind = 'uncached' if reply else 'user'
 
         # Agregar label a layout
-        self.add_widget(label)
\ No newline at end of file
+        self.add_widget(widget)
+        self.render_times[kind].append(time.perf_counter() - start)
+
+    def texture_memory(self):
+        # RGBA, 4 bytes per pixel
+        return sum(t.width * t.height * 4 for t in self.texture_cache.values() if t is not None)
+
+    def render_report(self):
+        lines = []
+        for kind, times in self.render_times.items():
+            mean = sum(times) / len(times) * 1000 if times else 0.0
+            lines.append(f'{kind:>8}: {len(times)} messages, {mean:.2f}ms per message')
+
+        lines.append(f'texture cache: {len(self.texture_cache)} textures, '
+                     f'{self.texture_memory() / 1024:.0f}KB')
+        return '\n'.join(lines)
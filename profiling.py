@@ -0,0 +1,71 @@
+"""Small measuring helpers shared by the benchmark and soak scripts."""
+from __future__ import division
+
+import gc
+import os
+import sys
+import time
+
+
+def rss_mb():
+    """Resident set size of this process in MB."""
+    if sys.platform.startswith("linux"):
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    if sys.platform == "win32":
+        import win32api
+        import win32process
+        info = win32process.GetProcessMemoryInfo(win32api.GetCurrentProcess())
+        return info["WorkingSetSize"] / (1024 * 1024)
+    # Other platforms only expose the peak, in bytes on macOS
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024)
+
+
+def percentile(values, q):
+    """Nearest-rank percentile, `q` between 0 and 100."""
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    rank = int(round(q / 100 * (len(values) - 1)))
+    return values[rank]
+
+
+def slope(xs, ys):
+    """Least squares slope of ys over xs (0.0 with fewer than two points)."""
+    n = len(xs)
+    if n < 2:
+        return 0.0
+    mean_x = sum(xs) / n
+    mean_y = sum(ys) / n
+    var = sum((x - mean_x) ** 2 for x in xs)
+    if not var:
+        return 0.0
+    return sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / var
+
+
+class GCPauses():
+    """Collects the duration of every garbage collection while installed."""
+
+    def __init__(self):
+        self.pauses = []
+        self._start = None
+
+    def install(self):
+        gc.callbacks.append(self._callback)
+
+    def uninstall(self):
+        if self._callback in gc.callbacks:
+            gc.callbacks.remove(self._callback)
+
+    def drain(self):
+        pauses, self.pauses = self.pauses, []
+        return pauses
+
+    def _callback(self, phase, info):
+        if phase == "start":
+            self._start = time.perf_counter()
+        elif self._start is not None:
+            self.pauses.append(time.perf_counter() - self._start)
+            self._start = None
@@ -0,0 +1,285 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""Soak test for the chatbot AI
+
+Replays recorded (one message per line) or synthetic conversation traffic
+against ai.AI at a fixed rate and concurrency for a given duration, sampling
+RSS, tracemalloc's top allocators, GC pauses and latency percentiles on every
+interval. The samples are written as a JSON time series and the RSS and p95
+latency trends are checked against a maximum slope, so a run exits with an
+error status when memory or latency keep growing.
+
+With --swap-every the model directory is reloaded and hot swapped in the
+background while the traffic runs, and the run fails if any message raises
+or takes longer than --max-latency (SWAP_MAX_LATENCY ms unless given).
+
+    ./soak.py -t 3600 -r 20 -c 4 -o soak.json
+    ./soak.py -t 120 -r 20 -c 4 -x 20 -m 500
+"""
+from __future__ import print_function, division
+
+import os
+import sys
+import time
+import random
+import threading
+import tracemalloc
+from contextlib import redirect_stdout
+from pathlib import Path
+
+import plac
+import srsly
+
+from ai import AI
+from profiling import rss_mb, percentile, slope, GCPauses
+
+
+# Default bound on the slowest message while hot swapping, in ms
+SWAP_MAX_LATENCY = 1000.0
+
+SYNTHETIC_SENTENCES = [
+    "hello bot",
+    "hi there",
+    "hey you",
+    "good morning",
+    "how are you doing bot",
+    "how do you feel",
+    "tell me a quote",
+    "say a famous phrase bot",
+    "inspire me with something",
+    "sing something",
+    "can you sing something for me",
+    "hi my name is Steve",
+    "how is the weather",
+    "goodbye friend",
+    "see you soon",
+    "have a good night",
+    "hola",
+    "¿cómo estás?",
+    "dime una frase famosa",
+    "hasta luego",
+]
+
+
+def synthetic_message():
+    n = random.choice([1, 1, 1, 2, 3])
+    return ". ".join(random.choice(SYNTHETIC_SENTENCES) for _ in range(n))
+
+
+class Traffic():
+    """Hands out messages to the workers and records how they went."""
+
+    def __init__(self, messages=None):
+        self.messages = messages
+        self.lock = threading.Lock()
+        self.latencies = []
+        self.errors = 0
+        self.sent = 0
+        # Next recorded message to hand out
+        self.cursor = 0
+
+    def next_message(self):
+        if self.messages:
+            with self.lock:
+                message = self.messages[self.cursor % len(self.messages)]
+                self.cursor += 1
+                return message
+        return synthetic_message()
+
+    def record(self, seconds, error=False):
+        with self.lock:
+            self.sent += 1
+            if error:
+                self.errors += 1
+            else:
+                self.latencies.append(seconds)
+
+    def drain(self):
+        with self.lock:
+            latencies, self.latencies = self.latencies, []
+            errors, self.errors = self.errors, 0
+            return latencies, errors
+
+
+def worker(ai, traffic, interval, deadline, stop):
+    next_send = time.perf_counter() + random.random() * interval
+    while not stop.is_set() and next_send < deadline:
+        delay = next_send - time.perf_counter()
+        if delay > 0:
+            stop.wait(delay)
+        start = time.perf_counter()
+        try:
+            ai.message(traffic.next_message())
+        except Exception:
+            traffic.record(time.perf_counter() - start, error=True)
+        else:
+            traffic.record(time.perf_counter() - start)
+        next_send += interval
+
+
+def swapper(ai, interval, deadline, stop, swaps):
+    while not stop.wait(interval) and time.perf_counter() < deadline:
+        swaps.append(ai.reload_pipeline())
+
+
+def take_sample(elapsed, traffic, gc_pauses, n_top):
+    latencies, errors = traffic.drain()
+    pauses = gc_pauses.drain()
+    sample = {
+        "t": elapsed,
+        "rss_mb": rss_mb(),
+        "messages": len(latencies),
+        "errors": errors,
+        # JSON has no NaN, windows without messages get nulls
+        "p50_ms": percentile(latencies, 50) * 1000 if latencies else None,
+        "p95_ms": percentile(latencies, 95) * 1000 if latencies else None,
+        "p99_ms": percentile(latencies, 99) * 1000 if latencies else None,
+        "max_ms": max(latencies) * 1000 if latencies else None,
+        "gc_pauses": len(pauses),
+        "gc_total_ms": sum(pauses) * 1000,
+        "gc_max_ms": max(pauses) * 1000 if pauses else 0.0,
+    }
+    if tracemalloc.is_tracing():
+        current, peak = tracemalloc.get_traced_memory()
+        sample["traced_mb"] = current / (1024 * 1024)
+        stats = tracemalloc.take_snapshot().statistics("lineno")[:n_top]
+        sample["top_allocators"] = [
+            {"where": str(stat.traceback), "kb": stat.size / 1024, "count": stat.count}
+            for stat in stats
+        ]
+    return sample
+
+
+def trends(samples, warmup):
+    """RSS and p95 latency slopes per hour, ignoring the warm-up samples."""
+    steady = [s for s in samples if s["t"] >= warmup and s["messages"]]
+    hours = [s["t"] / 3600 for s in steady]
+    return {
+        "rss_mb_per_hour": slope(hours, [s["rss_mb"] for s in steady]),
+        "p95_ms_per_hour": slope(hours, [s["p95_ms"] for s in steady]),
+        "samples": len(steady),
+    }
+
+
+@plac.annotations(
+    duration=("Seconds to run for", "option", "t", float),
+    rate=("Messages per second, across all workers", "option", "r", float),
+    concurrency=("Number of worker threads", "option", "c", int),
+    traffic_file=("Recorded traffic, one message per line. Synthetic if missing", "option", "f", Path),
+    interval=("Seconds between samples", "option", "i", float),
+    warmup=("Seconds at the start left out of the trend checks", "option", "w", float),
+    output=("Where to write the JSON report", "option", "o", Path),
+    max_rss_slope=("Fail if RSS grows faster than this, in MB per hour", "option", "s", float),
+    max_latency_slope=("Fail if p95 latency grows faster than this, in ms per hour", "option", "l", float),
+    no_tracemalloc=("Don't trace allocations (lower overhead)", "flag", "n"),
+    n_top=("Number of top allocators kept per sample", "option", "k", int),
+    swap_every=("Hot swap the model every this many seconds", "option", "x", float),
+    max_latency=("Fail if any message takes longer than this, in ms", "option", "m", float),
+)
+def main(duration=600.0, rate=10.0, concurrency=2, traffic_file=None, interval=10.0,
+         warmup=30.0, output=None, max_rss_slope=20.0, max_latency_slope=50.0,
+         no_tracemalloc=False, n_top=5, swap_every=None, max_latency=None):
+    """Run the soak test and check the memory and latency trends."""
+    if swap_every and max_latency is None:
+        max_latency = SWAP_MAX_LATENCY
+    messages = None
+    if traffic_file is not None:
+        with Path(traffic_file).open(encoding="utf8") as f:
+            messages = [line.strip() for line in f if line.strip()]
+        print("Replaying %d recorded messages" % len(messages))
+
+    ai = AI()
+    traffic = Traffic(messages)
+    gc_pauses = GCPauses()
+    if not no_tracemalloc:
+        tracemalloc.start()
+    gc_pauses.install()
+
+    stop = threading.Event()
+    start = time.perf_counter()
+    deadline = start + duration
+    samples = []
+    # The AI prints the intents and responses, keep them out of the report
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        workers = [
+            threading.Thread(
+                target=worker,
+                args=(ai, traffic, concurrency / rate, deadline, stop),
+                daemon=True,
+            )
+            for _ in range(concurrency)
+        ]
+        for thread in workers:
+            thread.start()
+        swaps = []
+        if swap_every:
+            workers.append(threading.Thread(
+                target=swapper, args=(ai, swap_every, deadline, stop, swaps), daemon=True))
+            workers[-1].start()
+        try:
+            while time.perf_counter() < deadline:
+                stop.wait(min(interval, max(0.0, deadline - time.perf_counter())))
+                sample = take_sample(time.perf_counter() - start, traffic, gc_pauses, n_top)
+                samples.append(sample)
+                print(
+                    "%7.0fs rss %7.1fMB p95 %7.1fms msgs %5d errors %d gc %.1fms"
+                    % (sample["t"], sample["rss_mb"], sample["p95_ms"] or 0.0,
+                       sample["messages"], sample["errors"], sample["gc_total_ms"]),
+                    file=sys.stderr,
+                )
+        finally:
+            stop.set()
+            for thread in workers:
+                thread.join()
+            gc_pauses.uninstall()
+            tracemalloc.stop()
+
+    result = trends(samples, warmup)
+    errors = sum(s["errors"] for s in samples)
+    failures = []
+    if errors:
+        failures.append("%d messages raised an error" % errors)
+    worst = max((s["max_ms"] for s in samples if s["max_ms"] is not None), default=0.0)
+    if max_latency is not None and worst > max_latency:
+        failures.append("slowest message took %.0fms (max %.0f)" % (worst, max_latency))
+    if swap_every and not any(swaps):
+        failures.append("no hot swap went through")
+    if result["rss_mb_per_hour"] > max_rss_slope:
+        failures.append("RSS grows %.1fMB/h (max %.1f)" % (result["rss_mb_per_hour"], max_rss_slope))
+    if result["p95_ms_per_hour"] > max_latency_slope:
+        failures.append("p95 latency grows %.1fms/h (max %.1f)" % (result["p95_ms_per_hour"], max_latency_slope))
+
+    print("Sent %d messages in %.0fs" % (sum(s["messages"] for s in samples) + errors, duration))
+    if swap_every:
+        print("Hot swaps: %d of %d went through" % (sum(swaps), len(swaps)))
+    print("Slowest message: %.0fms" % worst)
+    print("RSS trend: %+.2f MB/h" % result["rss_mb_per_hour"])
+    print("p95 latency trend: %+.2f ms/h" % result["p95_ms_per_hour"])
+    print(ai.language_report())
+    print(ai.tier_report())
+    for failure in failures:
+        print("FAIL:", failure)
+
+    if output is not None:
+        srsly.write_json(output, {
+            "config": {
+                "duration": duration, "rate": rate, "concurrency": concurrency,
+                "traffic_file": str(traffic_file) if traffic_file else None,
+                "interval": interval, "warmup": warmup,
+                "swap_every": swap_every, "max_latency": max_latency,
+            },
+            "samples": samples,
+            "trends": result,
+            "swaps": swaps,
+            "languages": ai.pipeline_stats,
+            "tiers": ai.tier_stats,
+            "failures": failures,
+        })
+        print("Saved report to", output)
+
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    plac.call(main)
@@ -21,6 +21,8 @@ from __future__ import unicode_literals, print_function
 
 import plac
 import random
+import time
+import srsly
 from pathlib import Path
 import spacy
 from spacy.util import minibatch, compounding
@@ -381,9 +383,59 @@ TRAIN_DATA = [
     model=("Model name. Defaults to blank 'en' model.", "option", "m", str),
     output_dir=("Optional output directory", "option", "o", Path),
     n_iter=("Number of training iterations", "option", "n", int),
+    resume=("Existing model directory to fine-tune instead of retraining", "option", "r", Path),
+    new_data=("JSONL file with annotated examples from logged conversations", "option", "d", Path),
+    replay=("Share of TRAIN_DATA replayed on each fine-tuning iteration", "option", "p", float),
+    compare=("Also run a full retrain and report time and accuracy against it", "flag", "c"),
 )
-def main(model=None, output_dir=None, n_iter=15):
-    """Load the model, set up the pipeline and train the parser."""
+def main(model=None, output_dir=None, n_iter=15, resume=None, new_data=None,
+         replay=0.5, compare=False):
+    """Load the model, set up the pipeline and train the parser.
+
+    With --resume, the parser of an already trained model directory is
+    fine-tuned on the --new-data examples mixed with a replay sample of
+    TRAIN_DATA instead of being trained again from scratch.
+    """
+    new_examples = load_examples(new_data) if new_data is not None else []
+    print("Loaded %d new examples" % len(new_examples))
+
+    if resume is not None:
+        start = time.time()
+        nlp = fine_tune(resume, new_examples, n_iter, replay)
+        tune_time = time.time() - start
+        print("Fine-tuned '%s' in %.2fs" % (resume, tune_time))
+
+        if compare:
+            start = time.time()
+            full = train(model, TRAIN_DATA + new_examples, n_iter)
+            full_time = time.time() - start
+            print("Full retrain took %.2fs" % full_time)
+            report(
+                [("fine-tune", nlp, tune_time), ("full retrain", full, full_time)],
+                new_examples,
+            )
+    else:
+        nlp = train(model, TRAIN_DATA + new_examples, n_iter)
+
+    # test the trained model
+    test_model(nlp)
+
+    # save model to output directory
+    if output_dir is not None:
+        output_dir = Path(output_dir)
+        if not output_dir.exists():
+            output_dir.mkdir()
+        nlp.to_disk(output_dir)
+        print("Saved model to", output_dir)
+
+        # test the saved model
+        print("Loading from", output_dir)
+        nlp2 = spacy.load(output_dir)
+        test_model(nlp2)
+
+
+def train(model, examples, n_iter):
+    """Train a fresh parser on top of `model` (or a blank 'en' model)."""
     if model is not None:
         nlp = spacy.load(model)  # load existing spaCy model
         print("Loaded model '%s'" % model)
@@ -402,39 +454,87 @@ def main(model=None, output_dir=None, n_iter=15):
     sentencizer = nlp_en.create_pipe("sentencizer")
     nlp.add_pipe(sentencizer)
 
-    for text, annotations in TRAIN_DATA:
+    for text, annotations in examples:
         for dep in annotations.get("deps", []):
             parser.add_label(dep)
 
+    examples = list(examples)
     pipe_exceptions = ["parser", "trf_wordpiecer", "trf_tok2vec", "sentencizer"]
     other_pipes = [pipe for pipe in nlp.pipe_names if pipe not in pipe_exceptions]
     with nlp.disable_pipes(*other_pipes):  # only train parser
         optimizer = nlp.begin_training()
         for itn in range(n_iter):
-            random.shuffle(TRAIN_DATA)
+            random.shuffle(examples)
             losses = {}
             # batch up the examples using spaCy's minibatch
-            batches = minibatch(TRAIN_DATA, size=compounding(4.0, 32.0, 1.001))
+            batches = minibatch(examples, size=compounding(4.0, 32.0, 1.001))
             for batch in batches:
                 texts, annotations = zip(*batch)
                 nlp.update(texts, annotations, sgd=optimizer, losses=losses)
             # print("Losses", losses)
+    return nlp
 
-    # test the trained model
-    test_model(nlp)
 
-    # save model to output directory
-    if output_dir is not None:
-        output_dir = Path(output_dir)
-        if not output_dir.exists():
-            output_dir.mkdir()
-        nlp.to_disk(output_dir)
-        print("Saved model to", output_dir)
+def fine_tune(model_dir, examples, n_iter, replay):
+    """Keep training the parser saved in `model_dir` on new examples.
 
-        # test the saved model
-        print("Loading from", output_dir)
-        nlp2 = spacy.load(output_dir)
-        test_model(nlp2)
+    Each iteration mixes the new examples with a random sample of
+    TRAIN_DATA so the parser doesn't forget what it already knew.
+    """
+    nlp = spacy.load(model_dir)
+    print("Resuming from '%s'" % model_dir)
+
+    # New labels resize the output layer but keep the learned weights
+    parser = nlp.get_pipe("parser")
+    for text, annotations in examples:
+        for dep in annotations.get("deps", []):
+            parser.add_label(dep)
+
+    n_replay = min(len(TRAIN_DATA), int(round(len(TRAIN_DATA) * replay)))
+    pipe_exceptions = ["parser", "trf_wordpiecer", "trf_tok2vec", "sentencizer"]
+    other_pipes = [pipe for pipe in nlp.pipe_names if pipe not in pipe_exceptions]
+    with nlp.disable_pipes(*other_pipes):  # only train parser
+        optimizer = nlp.resume_training()
+        for itn in range(n_iter):
+            batch_data = list(examples) + random.sample(TRAIN_DATA, n_replay)
+            random.shuffle(batch_data)
+            losses = {}
+            batches = minibatch(batch_data, size=compounding(4.0, 32.0, 1.001))
+            for batch in batches:
+                texts, annotations = zip(*batch)
+                nlp.update(texts, annotations, sgd=optimizer, losses=losses)
+            # print("Losses", losses)
+    return nlp
+
+
+def load_examples(path):
+    """Read annotated examples, one {"text", "heads", "deps"} object per line."""
+    return [
+        (eg["text"], {"heads": eg["heads"], "deps": eg["deps"]})
+        for eg in srsly.read_jsonl(path)
+    ]
+
+
+def evaluate(nlp, examples):
+    """Share of annotated tokens whose head and label were both predicted."""
+    correct = 0
+    total = 0
+    docs = nlp.pipe([text for text, _ in examples])
+    for doc, (text, annotations) in zip(docs, examples):
+        for token, head, dep in zip(doc, annotations["heads"], annotations["deps"]):
+            total += 1
+            if token.head.i == head and token.dep_ == dep:
+                correct += 1
+    return correct / total if total else 0.0
+
+
+def report(runs, new_examples):
+    print("\n%-14s %8s %10s %10s" % ("", "time", "old data", "new data"))
+    for name, nlp, seconds in runs:
+        old_acc = evaluate(nlp, TRAIN_DATA)
+        new_acc = evaluate(nlp, new_examples) if new_examples else float("nan")
+        print("%-14s %7.2fs %9.1f%% %9.1f%%" % (name, seconds, old_acc * 100, new_acc * 100))
+    print()
 
 
 def test_model(nlp):
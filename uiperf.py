@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""Scripted conversation for UI performance checks
+
+Starts ChatbotApp in a hidden window with frame timing on, types each line
+of the script into the input, sends it, and quits when the script is done.
+Exits with an error status when more frames than --max-jank go over the
+frame budget. Machines without a display can run it under xvfb-run.
+
+    ./uiperf.py -s conversation.txt -o trace.json
+"""
+from __future__ import print_function
+
+import os
+import sys
+from pathlib import Path
+
+import plac
+
+os.environ.setdefault('KIVY_NO_ARGS', '1')
+
+from kivy.config import Config
+Config.set('graphics', 'window_state', 'hidden')
+
+from kivy.app import App
+from kivy.clock import Clock
+
+import frameprof
+from chatbot import ChatbotApp
+from corpus import TEST_SENTENCES
+
+
+def play(lines, type_delay, pause):
+    # Type a line, wait as a person would before pressing Send, repeat
+    inputs = App.get_running_app().root.inputs
+    remaining = list(lines)
+
+    def type_line(dt):
+        if not remaining:
+            Clock.schedule_once(lambda dt: App.get_running_app().stop(), pause)
+            return
+        inputs.text_input.text = remaining.pop(0)
+        Clock.schedule_once(send, type_delay)
+
+    def send(dt):
+        inputs.on_send(inputs.button)
+        Clock.schedule_once(type_line, pause)
+
+    type_line(0)
+
+
+@plac.annotations(
+    script=("Text file with one user message per line", "option", "s", Path),
+    output=("Where to write the Chrome trace", "option", "o", Path),
+    type_delay=("Seconds between typing a message and sending it", "option", "d", float),
+    pause=("Seconds between a reply and the next message", "option", "p", float),
+    max_jank=("Fail if more frames than this go over budget", "option", "j", int),
+)
+def main(script=None, output=Path('frames.json'), type_delay=1.0, pause=1.0, max_jank=0):
+    if script is not None:
+        with Path(script).open(encoding='utf8') as f:
+            lines = [line.strip() for line in f if line.strip()]
+    else:
+        lines = TEST_SENTENCES
+
+    os.environ['CHATBOT_FRAMEPROF'] = str(output)
+    app = ChatbotApp()
+    # Give the app a moment to load the model and bind the inputs
+    Clock.schedule_once(lambda dt: play(lines, type_delay, pause), 2)
+    app.run()
+
+    janky = frameprof.profiler.janky_frames()
+    if len(janky) > max_jank:
+        print('FAIL: %d frames over budget (max %d)' % (len(janky), max_jank))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    plac.call(main)